@@ -1,21 +1,89 @@
 import argparse
+import asyncio
+import contextlib
+import email.utils
 import json
-import subprocess
+import math
 import sys
-import requests
+import tempfile
+import threading
+import time
+import httpx
 import os
+import random
 import re
+import shlex
+import signal
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Union, Tuple
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Union, Tuple
+
+try:
+    import h2  # lets httpx speak HTTP/2, if it's installed
+except ImportError:
+    h2 = None
+
+try:
+    import orjson  # much quicker JSON, if it's installed
+except ImportError:
+    orjson = None
+
+try:
+    import re2  # linear-time regexes (google-re2), if it's installed
+except ImportError:
+    re2 = None
+
+try:
+    import readline  # arrow keys and history at the prompt, where available
+except ImportError:
+    readline = None
+
+try:
+    import termios  # so we can put the terminal back how we found it
+except ImportError:
+    termios = None
 
 # Where we store our precious API key
 CONFIG_FILE = "config.json"
 
-@dataclass
-class Message:
-    """A single message in our chat - could be from the user or the AI"""
-    role: str  # 'user' or 'assistant'
-    content: str
+OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Everything but the key and title is the same on every request, so build it once
+_STATIC_HEADERS = MappingProxyType({
+    "HTTP-Referer": "https://localhost",
+    "Content-Type": "application/json"
+})
+
+# The system prompts never change either
+_SYSTEM_MSG = {"role": "system", "content": "You are a friendly and helpful AI assistant."}
+_AGENT_SYSTEM_MSG = {"role": "system", "content": """Hey there! I'm your coding buddy and I can help you with:
+1. 💻 Writing code in any programming language
+2. 📝 Creating and updating files
+3. 🐚 Running shell commands
+4. 🤝 Helping with programming questions
+5. 📋 Breaking down complex tasks into simple steps
+
+Just let me know what you need help with!"""}
+
+# While streaming, flush the terminal every this many characters (or at a newline)
+STREAM_FLUSH_CHARS = 64
+
+# How much of the chat we send back each turn (the system prompt always comes along)
+MAX_HISTORY_MESSAGES = 20
+MAX_HISTORY_TOKENS = 6000  # a rough budget - we guess ~4 characters per token
+
+# Hiccups from OpenRouter worth another try, and how hard we try
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 8.0
+
+# Keep at most this much of a command's output in memory; the rest goes to a log file
+MAX_INLINE_OUTPUT = 1_048_576
+READ_CHUNK_SIZE = 64 * 1024
+
+# If a command has any of these, it really does need a shell to run it
+SHELL_METACHARACTERS = frozenset("|&;<>()$`\\*?[]{}~!#\n")
 
 @dataclass
 class ExecutableStep:
@@ -31,32 +99,159 @@ class ExecutionResult:
     output: str   # what was printed
     error: Optional[str] = None  # any oopsies that happened
 
-def load_or_create_config() -> str:
-    """Try to find our API key, or ask nicely for a new one"""
+@dataclass
+class CommandResult:
+    """How a single shell command went"""
+    returncode: int
+    stdout: str  # the first MAX_INLINE_OUTPUT bytes, anyway
+    stderr: str
+    stdout_log: Optional[str] = None  # where the full output went, if there was too much
+    stderr_log: Optional[str] = None
+
+def _json_dumps(obj: Any) -> bytes:
+    """JSON as bytes - orjson if we've got it, the standard library if not"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def _json_loads(data: Union[bytes, str]) -> Any:
+    """The other direction - parse JSON, quickly if we can"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _read_config_key() -> Optional[str]:
+    """Peek at the config file for a saved API key 👀"""
     if os.path.exists(CONFIG_FILE):
         try:
-            with open(CONFIG_FILE, 'r') as config_file:
-                config = json.load(config_file)
-                if config.get('api_key'):
-                    return config['api_key']
+            with open(CONFIG_FILE, 'rb') as config_file:
+                return _json_loads(config_file.read()).get('api_key') or None
         except:
-            # No worries if it fails, we'll just ask for a new key
+            # No worries if it fails, the caller decides what to do next
             pass
+    return None
+
+# The key, once we've found it (or been handed it) - forget_api_key() clears it
+_api_key: Optional[str] = None
+
+def get_api_key(interactive: bool = True) -> Optional[str]:
+    """Find our API key once and remember it for the rest of the run 🔑
+    
+    The environment wins, then the config file. If neither has one we ask
+    for it (and save it) when interactive, or return None when not. Only a
+    key we actually found is remembered, so a miss means we look again next time.
+    """
+    global _api_key
+    if _api_key is None:
+        _api_key = os.getenv('OPENROUTER_API_KEY') or (
+            load_or_create_config() if interactive else _read_config_key()
+        ) or None
+    return _api_key
+
+def forget_api_key() -> None:
+    """Make the next get_api_key() go looking again (say, after a rejected key)"""
+    global _api_key
+    _api_key = None
+
+def load_or_create_config() -> str:
+    """Try to find our API key, or ask nicely for a new one"""
+    api_key = _read_config_key()
+    if api_key:
+        return api_key
     
     print("Hey! Looks like I need an OpenRouter API key to help you.")
     api_key = input("Would you mind sharing your OpenRouter API key? ")
     
-    # Let's save this for next time
+    # Let's save this for next time - written to the side and swapped in,
+    # so a crash halfway through can't leave us with a broken config
+    temp_file = CONFIG_FILE + ".tmp"
     try:
-        with open(CONFIG_FILE, 'w') as config_file:
-            json.dump({'api_key': api_key}, config_file)
+        with open(temp_file, 'wb') as config_file:
+            config_file.write(_json_dumps({'api_key': api_key}))
+            config_file.flush()
+            os.fsync(config_file.fileno())
+        os.replace(temp_file, CONFIG_FILE)
         print("✨ Great! I've saved that API key for next time!")
     except Exception as e:
+        with contextlib.suppress(OSError):
+            os.remove(temp_file)
         print(f"😅 Oops, couldn't save the API key: {e}")
     
     return api_key
 
-def send_prompt_to_openrouter(prompt: str, model_name: str = "mistralai/mistral-7b-instruct") -> str:
+def _new_client(headers: Optional[Dict[str, str]] = None) -> httpx.AsyncClient:
+    """A pooled client (HTTP/2 when h2 is around), so we only pay for the TLS handshake once 🤝"""
+    return httpx.AsyncClient(
+        http2=h2 is not None,
+        headers=headers,
+        # Give up quickly if we can't even connect, but let the AI take its time
+        timeout=httpx.Timeout(60.0, connect=5.0),
+        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+    )
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """How long to wait before trying again ⏳
+    
+    If the server told us (Retry-After), we listen; otherwise it's jittered
+    exponential backoff.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            try:
+                seconds = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = math.nan
+        # Ignore nonsense like "nan" or "inf"; never wait less than nothing or more than a minute
+        if math.isfinite(seconds):
+            return min(max(seconds, 0.0), 60.0)
+    
+    backoff = 0.5 * 2 ** (attempt - 1)
+    return min(backoff + random.uniform(0, backoff / 2), MAX_BACKOFF_SECONDS)
+
+async def _post_completion(
+    client: httpx.AsyncClient,
+    url: str,
+    content: bytes,
+    headers: Optional[Dict[str, str]] = None,
+    stream: bool = False,
+) -> httpx.Response:
+    """POST to OpenRouter, shrugging off rate limits and brief outages 🔁
+    
+    Failing to connect and the usual "try again later" statuses get a few more
+    attempts. Anything else fails straight away: a bad key or bad request, and
+    also a timeout or dropped connection once the request went out, since the
+    server may already be generating (and billing) that completion.
+    With stream=True the caller is responsible for closing the response.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        request = client.build_request("POST", url, headers=headers, content=content)
+        try:
+            response = await client.send(request, stream=stream)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+            # The request never reached the server, so trying again is safe
+            if attempt == MAX_ATTEMPTS:
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+            continue
+        
+        if response.status_code in RETRYABLE_STATUS_CODES and attempt < MAX_ATTEMPTS:
+            await response.aclose()
+            await asyncio.sleep(_retry_delay(attempt, response))
+            continue
+        
+        if response.is_error:
+            await response.aclose()
+            response.raise_for_status()
+        return response
+
+async def send_prompt_to_openrouter(
+    prompt: str,
+    model_name: str = "mistralai/mistral-7b-instruct",
+    client: Optional[httpx.AsyncClient] = None,
+) -> str:
     """Let's chat with the AI model!
     
     This is where the magic happens - we send your message to the AI
@@ -65,60 +260,169 @@ def send_prompt_to_openrouter(prompt: str, model_name: str = "mistralai/mistral-
     Args:
         prompt: What you want to ask the AI
         model_name: Which AI model to chat with (Mistral-7B by default)
+        client: A client to reuse across calls (we'll open a one-off one if not)
         
     Returns:
         The AI's response
         
     Raises:
         ValueError: If we can't find an API key
-        requests.RequestException: If something goes wrong talking to OpenRouter
+        httpx.HTTPError: If something goes wrong talking to OpenRouter
     """
-    # First check if we have the key in our environment
-    api_key = os.getenv('OPENROUTER_API_KEY')
-    
-    # If not there, check our config file
-    if not api_key and os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                api_key = config.get('api_key')
-        except:
-            pass
-    
+    api_key = get_api_key(interactive=False)
     if not api_key:
         raise ValueError("Oops! I can't find the OpenRouter API key anywhere!")
     
     # Set up our chat with the AI
     headers = {
-        "Authorization": f"Bearer {api_key}",
-        "HTTP-Referer": "https://localhost",
+        **_STATIC_HEADERS,
         "X-Title": "Your Friendly AI Assistant",
-        "Content-Type": "application/json"
+        "Authorization": f"Bearer {api_key}"
     }
     
     # Prepare what we want to say
     data = {
         "model": model_name,
-        "messages": [
-            {"role": "system", "content": "You are a friendly and helpful AI assistant."},
-            {"role": "user", "content": prompt}
-        ]
+        "messages": [_SYSTEM_MSG, {"role": "user", "content": prompt}]
     }
     
     try:
-        # Let's talk to the AI!
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=data
+        async with contextlib.AsyncExitStack() as stack:
+            if client is None:
+                client = await stack.enter_async_context(_new_client())
+            
+            # Let's talk to the AI!
+            response = await _post_completion(
+                client,
+                OPENROUTER_API_URL,
+                _json_dumps(data),
+                headers=headers
+            )
+            result = _json_loads(response.content)
+            return result['choices'][0]['message']['content']
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 401:
+            # That key was turned down - look it up afresh next time
+            forget_api_key()
+        raise httpx.HTTPError(f"Uh oh! Couldn't chat with OpenRouter: {str(e)}")
+
+async def _spawn(cmd: str, own_session: bool = False) -> asyncio.subprocess.Process:
+    """Start a command, skipping the extra /bin/sh when it doesn't need one ⚡
+    
+    With own_session the command gets its own process group, so stopping it
+    takes anything the shell spawned too. It also loses the terminal, though
+    (no sudo or ssh prompts), so only side-by-side runs ask for it.
+    """
+    options = dict(
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=own_session and os.name == 'posix'
+    )
+    
+    if os.name == 'posix' and not SHELL_METACHARACTERS.intersection(cmd):
+        try:
+            args = shlex.split(cmd)
+            if args:
+                return await asyncio.create_subprocess_exec(*args, **options)
+        except (OSError, ValueError):
+            # Shell builtins, 'FOO=bar cmd', missing programs, unbalanced quotes...
+            # let the shell sort it out
+            pass
+    
+    return await asyncio.create_subprocess_shell(cmd, **options)
+
+async def _drain(stream: asyncio.StreamReader) -> Tuple[str, Optional[str]]:
+    """Read a pipe to the end without letting a chatty command eat all our memory 🪣
+    
+    The first MAX_INLINE_OUTPUT bytes stay in memory; past that, everything
+    (from the very start) is written to a temp file instead. Returns the
+    in-memory text and the file's path, or None if it all fit.
+    """
+    head = bytearray()
+    log_file = None
+    try:
+        while chunk := await stream.read(READ_CHUNK_SIZE):
+            if log_file is None:
+                if len(head) + len(chunk) <= MAX_INLINE_OUTPUT:
+                    head += chunk
+                    continue
+                # The disk work happens on a worker thread so the event loop keeps going
+                log_file = await asyncio.to_thread(
+                    tempfile.NamedTemporaryFile, prefix="ai_agent_", suffix=".log", delete=False
+                )
+                await asyncio.to_thread(log_file.write, bytes(head))
+                head += chunk[:MAX_INLINE_OUTPUT - len(head)]
+            await asyncio.to_thread(log_file.write, chunk)
+    finally:
+        if log_file is not None:
+            await asyncio.to_thread(log_file.close)
+    
+    return head.decode('utf-8', errors='replace'), log_file.name if log_file is not None else None
+
+async def _run_command(cmd: str, own_session: bool = False) -> CommandResult:
+    """Run one shell command without holding up the event loop 🐚"""
+    proc = await _spawn(cmd, own_session)
+    try:
+        (stdout, stdout_log), (stderr, stderr_log) = await asyncio.gather(
+            _drain(proc.stdout),
+            _drain(proc.stderr)
         )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
-    except requests.RequestException as e:
-        raise requests.RequestException(f"Uh oh! Couldn't chat with OpenRouter: {str(e)}")
+        returncode = await proc.wait()
+    except asyncio.CancelledError:
+        # Somebody else in the group failed (or we're shutting down) - stop it
+        if proc.returncode is None:
+            if own_session and os.name == 'posix':
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+            await proc.wait()
+        raise
+    
+    return CommandResult(returncode, stdout, stderr, stdout_log, stderr_log)
 
-def execute_code_and_commands(blocks: Dict[str, str], commands: List[str]) -> ExecutionResult:
+async def _run_commands_concurrently(commands: List[str]) -> List[Optional[CommandResult]]:
+    """Run independent commands side by side, stopping the lot on the first failure 🏁
+    
+    Results come back in the same order as the commands; anything we had to
+    stop early is None.
+    """
+    tasks = [asyncio.create_task(_run_command(cmd, own_session=True)) for cmd in commands]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            if (await finished).returncode != 0:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    return [
+        task.result() if not task.cancelled() and task.exception() is None else None
+        for task in tasks
+    ]
+
+def _write_if_changed(filename: str, code: str) -> bool:
+    """Write a file, unless it already says exactly this 💾
+    
+    Returns True if we actually wrote something.
+    """
+    new_content = code.encode()
+    path = Path(filename)
+    try:
+        # Cheap size check first - only read the old file back if it could match
+        if path.stat().st_size == len(new_content) and path.read_bytes() == new_content:
+            return False
+    except FileNotFoundError:
+        pass
+    
+    path.write_bytes(new_content)
+    return True
+
+async def execute_code_and_commands(
+    blocks: Dict[str, str],
+    commands: List[str],
+    concurrent: bool = False,
+) -> ExecutionResult:
     """Time to make things happen! 🚀
     
     We'll create/update any files you need and run any commands you've asked for.
@@ -126,35 +430,44 @@ def execute_code_and_commands(blocks: Dict[str, str], commands: List[str]) -> Ex
     Args:
         blocks: Your code, organized by filename
         commands: Any shell commands you want to run
+        concurrent: Run the commands side by side instead of one after another
+            (only for commands that don't depend on each other!)
     
     Returns:
         How it all went - success or failure, output, and any oopsies
     """
     output_lines = []
     try:
-        # First, let's handle any code files
-        for filename, code in blocks.items():
-            with open(filename, 'w') as f:
-                f.write(code)
-            output_lines.append(f"✨ Created/Updated {filename}")
+        # First, let's handle any code files - all at once, so the disk can overlap them
+        if blocks:
+            written = await asyncio.gather(
+                *(asyncio.to_thread(_write_if_changed, filename, code) for filename, code in blocks.items())
+            )
+            output_lines.extend(
+                f"✨ Created/Updated {filename}" if changed else f"↔ Unchanged {filename}"
+                for filename, changed in zip(blocks, written)
+            )
         
         # Now let's run those commands
-        for cmd in commands:
+        results = await _run_commands_concurrently(commands) if concurrent else None
+        for index, cmd in enumerate(commands):
             output_lines.append(f"\n🔧 Running: {cmd}")
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                encoding='utf-8'
-            )
+            result = results[index] if results is not None else await _run_command(cmd)
+            if result is None:
+                output_lines.append("⏹️ Stopped early - another command failed")
+                continue
             
             if result.stdout:
-                output_lines.append("📝 Output:")
+                if result.stdout_log:
+                    output_lines.append(f"📝 Output (truncated, full log: {result.stdout_log}):")
+                else:
+                    output_lines.append("📝 Output:")
                 output_lines.append(result.stdout)
             
             if result.returncode != 0:
                 error_msg = f"❌ Command failed: {cmd}\n💥 Error: {result.stderr}"
+                if result.stderr_log:
+                    error_msg += f"\n(truncated, full log: {result.stderr_log})"
                 return ExecutionResult(
                     success=False,
                     output='\n'.join(output_lines),
@@ -174,57 +487,64 @@ def execute_code_and_commands(blocks: Dict[str, str], commands: List[str]) -> Ex
         )
 
 class ChatbotAgent:
-    def __init__(self, api_key: str):
+    # Compiled once - every reply gets a single pass with this. It's either a
+    # ```filename code block (groups 1-2) or a $SHELL: line (group 3).
+    # re2 keeps long replies with unclosed blocks from going quadratic;
+    # the flags are inline so both engines read the pattern the same way
+    _EXTRACT_RE = (re2 or re).compile(r"(?m)```(\w+(?:\.\w+)?)\n((?s:.*?))```|\$SHELL:\s*(.+)$")
+    
+    def __init__(self, api_key: Optional[str] = None):
         """Get ready to help with coding tasks! 🤖"""
-        self.api_key = api_key
-        self.api_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.api_key = api_key or get_api_key()
+        if not self.api_key:
+            raise ValueError("Oops! I can't find the OpenRouter API key anywhere!")
+        self.api_url = OPENROUTER_API_URL
         self.headers = {
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "https://localhost",
+            **_STATIC_HEADERS,
             "X-Title": "Your Coding Buddy",
-            "Content-Type": "application/json"
+            "Authorization": f"Bearer {self.api_key}"
         }
+        self.model = "mistralai/mistral-7b-instruct"
         # Start with a friendly system message
-        self.conversation_history: List[Message] = [
-            Message(role="system", content="""Hey there! I'm your coding buddy and I can help you with:
-1. 💻 Writing code in any programming language
-2. 📝 Creating and updating files
-3. 🐚 Running shell commands
-4. 🤝 Helping with programming questions
-5. 📋 Breaking down complex tasks into simple steps
-
-Just let me know what you need help with!""")
-        ]
+        # Kept in the exact shape OpenRouter wants, so each turn can send it as-is
+        self.conversation_history: List[Dict[str, str]] = [_AGENT_SYSTEM_MSG]
+        # ...alongside each message already encoded, so a turn only encodes what's
+        # new (add and drop messages through _remember/_trim_history to keep them in step)
+        self._encoded_history: List[bytes] = [_json_dumps(_AGENT_SYSTEM_MSG)]
+        self._body_prefix = _json_dumps({"model": self.model, "stream": True})[:-1] + b',"messages":['
+        # One connection pool for the whole conversation
+        self._client = _new_client(self.headers)
+        
+    async def aclose(self) -> None:
+        """Hang up the connection when we're done 📴"""
+        await self._client.aclose()
         
-    def chat(self, user_input: str) -> str:
-        """Have a chat and maybe write some code! 💭"""
-        self.conversation_history.append(Message(role="user", content=user_input))
+    async def chat(self, user_input: str) -> str:
+        """Have a chat and maybe write some code! 💭
+        
+        The AI's reply is printed as it streams in, so what we hand back is
+        just the report on anything we ran (empty if there was nothing to do).
+        """
+        self._remember("user", user_input)
+        self._trim_history()
         
         try:
             # Let's see what the AI thinks about this
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json={
-                    "model": "mistralai/mistral-7b-instruct",
-                    "messages": [{"role": m.role, "content": m.content} for m in self.conversation_history]
-                }
+            ai_response = await self._stream_reply(
+                self._body_prefix + b",".join(self._encoded_history) + b"]}"
             )
-            response.raise_for_status()
-            ai_response = response.json()['choices'][0]['message']['content']
             
             # Check if we need to do anything
-            code_blocks = self._extract_code_blocks(ai_response)
-            shell_commands = self._extract_shell_commands(ai_response)
+            code_blocks, shell_commands = self._extract(ai_response)
             
             # Make it happen!
-            result = self._handle_execution(code_blocks, shell_commands)
+            result = await self._handle_execution(code_blocks, shell_commands)
             
             # Remember what we talked about
-            self.conversation_history.append(Message(role="assistant", content=ai_response))
+            self._remember("assistant", ai_response)
             
             # Put it all together nicely
-            final_response = ai_response
+            final_response = ""
             if result.output:
                 final_response += f"\n\n📋 Here's what happened:\n{result.output}"
             if result.error:
@@ -235,44 +555,117 @@ Just let me know what you need help with!""")
         except Exception as e:
             return f"💥 Oops! {str(e)}"
     
-    def _extract_code_blocks(self, text: str) -> Dict[str, str]:
-        """Find any code blocks in our conversation 🔍"""
-        code_blocks = {}
-        code_pattern = r"```(\w+(?:\.\w+)?)\n(.*?)```"
+    def _remember(self, role: str, content: str) -> None:
+        """Add a message to our history (and its encoded copy) 🧠"""
+        message = {"role": role, "content": content}
+        self.conversation_history.append(message)
+        self._encoded_history.append(_json_dumps(message))
+    
+    def _trim_history(self) -> None:
+        """Forget the oldest turns so each request stays a sensible size ✂️
         
-        for match in re.finditer(code_pattern, text, re.DOTALL):
-            filename, code = match.groups()
-            code_blocks[filename] = code.strip()
-            
-        return code_blocks
+        The system prompt and the newest message always stay, and we drop whole
+        turns, so what's left still starts with a question rather than an answer.
+        """
+        history = self.conversation_history
+        overflow = len(history) - 1 - MAX_HISTORY_MESSAGES
+        if overflow > 0:
+            del history[1:1 + overflow]
+            del self._encoded_history[1:1 + overflow]
+        
+        tokens = sum(len(message["content"]) // 4 for message in history)
+        while len(history) > 2 and (tokens > MAX_HISTORY_TOKENS or history[1]["role"] != "user"):
+            tokens -= len(history.pop(1)["content"]) // 4
+            del self._encoded_history[1]
+    
+    async def _stream_reply(self, body: bytes) -> str:
+        """Print the AI's words as they arrive and hand back the whole thing 🌊"""
+        chunks: List[str] = []
+        unflushed = 0
+        response = await _post_completion(self._client, self.api_url, body, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                # Server-sent events: we only care about the "data: ..." lines
+                if not line.startswith("data: "):
+                    continue
+                payload = line[len("data: "):].strip()
+                if payload == "[DONE]":
+                    break
+                
+                event = _json_loads(payload)
+                if "error" in event:
+                    raise RuntimeError(event["error"].get("message", "the stream broke off"))
+                
+                for choice in event.get("choices", []):
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        sys.stdout.write(delta)
+                        chunks.append(delta)
+                        unflushed += len(delta)
+                        if unflushed >= STREAM_FLUSH_CHARS or "\n" in delta:
+                            sys.stdout.flush()
+                            unflushed = 0
+        finally:
+            sys.stdout.flush()
+            await response.aclose()
+        
+        return "".join(chunks)
     
-    def _extract_shell_commands(self, text: str) -> List[str]:
-        """Find any shell commands we need to run 🐚"""
-        shell_pattern = r"\$SHELL:\s*(.+)$"
-        return [match.group(1).strip() for match in re.finditer(shell_pattern, text, re.MULTILINE)]
+    def _extract(self, text: str) -> Tuple[Dict[str, str], List[str]]:
+        """Find any code blocks and shell commands in one sweep 🔍"""
+        code_blocks: Dict[str, str] = {}
+        shell_commands: List[str] = []
+        for m in self._EXTRACT_RE.finditer(text):
+            if m.group(1):
+                code_blocks[m.group(1)] = m.group(2).strip()
+            else:
+                shell_commands.append(m.group(3).strip())
+        return code_blocks, shell_commands
     
-    def _handle_execution(self, code_blocks: Dict[str, str], commands: List[str]) -> ExecutionResult:
+    async def _handle_execution(self, code_blocks: Dict[str, str], commands: List[str]) -> ExecutionResult:
         """Time to make the magic happen! ✨"""
-        return execute_code_and_commands(code_blocks, commands)
+        return await execute_code_and_commands(code_blocks, commands)
 
-def main():
-    """Let's get this party started! 🎉"""
-    try:
-        # First things first - we need that API key
-        api_key = os.getenv('OPENROUTER_API_KEY') or load_or_create_config()
-        if not api_key:
-            print("❌ Oops! I need an API key to help you!")
-            return 1
+async def _ainput(prompt: str) -> str:
+    """Wait for the keyboard without holding up the event loop ⌨️
+    
+    The read happens on a daemon thread so Ctrl+C can still end things
+    while we're sitting at the prompt.
+    """
+    loop = asyncio.get_running_loop()
+    line_future = loop.create_future()
+    
+    def settle(line: Optional[str], error: Optional[BaseException]) -> None:
+        if line_future.done():
+            return
+        if error is not None:
+            line_future.set_exception(error)
+        else:
+            line_future.set_result(line)
+    
+    def read_line() -> None:
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, None, e)
+        else:
+            loop.call_soon_threadsafe(settle, line, None)
+    
+    threading.Thread(target=read_line, daemon=True).start()
+    return await line_future
 
-        print("🤖 Hi! I'm your coding assistant!")
-        print("💡 I can help you write code, create files, run commands, and more!")
-        print("👋 Just type 'exit' when you're done.")
-        
-        chatbot = ChatbotAgent(api_key)
-        
+async def amain(api_key: str) -> None:
+    """Our chat loop - keyboard input runs off to the side so the loop stays free ⌨️"""
+    print("🤖 Hi! I'm your coding assistant!")
+    print("💡 I can help you write code, create files, run commands, and more!")
+    print("👋 Just type 'exit' when you're done.")
+    
+    chatbot = ChatbotAgent(api_key)
+    
+    try:
         while True:
             try:
-                user_input = input("\n👤 You: ").strip()
+                user_input = (await _ainput("\n👤 You: ")).strip()
                 
                 if user_input.lower() in ['exit', 'quit', 'bye']:
                     print("👋 Take care! Come back if you need more help!")
@@ -282,18 +675,42 @@ def main():
                     continue
                 
                 print("\n🤖 Assistant: ", end="")
-                response = chatbot.chat(user_input)
+                response = await chatbot.chat(user_input)
                 print(response)
                 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
                 print("\n👋 Catch you later!")
                 break
             except Exception as e:
                 print(f"❌ Whoops! {e}")
-                
+    finally:
+        await chatbot.aclose()
+
+def main():
+    """Let's get this party started! 🎉"""
+    # readline tweaks the terminal while it waits at the prompt. If Ctrl+C ends
+    # us mid-prompt its thread never gets to undo that, so we do it ourselves
+    terminal_state = None
+    if termios is not None and sys.stdin.isatty():
+        terminal_state = termios.tcgetattr(sys.stdin.fileno())
+    
+    try:
+        # First things first - we need that API key
+        api_key = get_api_key()
+        if not api_key:
+            print("❌ Oops! I need an API key to help you!")
+            return 1
+
+        asyncio.run(amain(api_key))
+        
+    except KeyboardInterrupt:
+        print("\n👋 Catch you later!")
     except Exception as e:
         print(f"❌ Something unexpected happened: {e}")
         return 1
+    finally:
+        if terminal_state is not None:
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, terminal_state)
     
     return 0
 